@@ -63,16 +63,20 @@ async def main_coro(manifest: str):
     site = web.TCPSite(runner, port=config.server.port)
     await site.start()
     LOGGER.info("Server running on port %i", config.server.port)
-
-    # TODO: Are we supposed to expose the runner somehow to clean up on shutdown?
-    #await runner.cleanup()
+    # Return the runner so the caller can clean up (e.g. delete staged inputs) on shutdown:
+    return runner
 
 @click.command()
 @click.option("--manifest", default="", help="Location of (optional) manifest file relative to current working dir")
 def main(manifest: str):
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(main_coro(manifest))
-    loop.run_forever()
+    runner = loop.run_until_complete(main_coro(manifest))
+    try:
+        loop.run_forever()
+    except (web.GracefulExit, KeyboardInterrupt):
+        pass
+    finally:
+        loop.run_until_complete(runner.cleanup())
 
 if __name__ == "__main__":
     # Linter error here is caused by PyLint not understanding the click decorator:
@@ -1,32 +1,258 @@
 """Aiohttp microservice authentication tools
 
-Currently only supports simple basic auth middleware
+Authentication is pluggable via BaseAuthenticator subclasses, wrapped into an aiohttp middleware by
+get_authentication_middleware(). Currently provided:
+
+- BasicAuthenticator: HTTP basic auth against configured USERS, whose passwords may be stored hashed (see
+  hash_password()). Successfully verified credentials are held in a bounded LRU cache so repeat requests (e.g. status
+  polls) skip the deliberately-slow hash check, which otherwise runs in an executor off the event loop. Concurrent
+  requests with the same credentials share a single check. Failed attempts are remembered briefly, and clients with too
+  many recent failures are refused without hashing at all (other clients can still log in as the same user).
+- JobTokenSigner: short-lived HMAC-signed tokens scoped to a single job ID, which grant read access to that job's
+  status and websocket endpoints without a full credential check.
 """
 
 # Built-Ins:
+from abc import ABC, abstractmethod
+from asyncio import Future, ensure_future, get_event_loop, shield
+from base64 import b64decode, urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from concurrent.futures import Executor
+from hashlib import pbkdf2_hmac, sha256
+import hmac
+from logging import getLogger
+import os
+import time
 import typing
 
 # External Imports:
-from aiohttp import web
-from aiohttp_basicauth_middleware import basic_auth_middleware
+from aiohttp import hdrs, web
+from cachetools import LRUCache, TTLCache
 
 # Local Imports:
 from .config import Config
 
+LOGGER = getLogger(__name__)
 
-def get_authentication_middleware(config: Config) -> typing.Callable[
-        [web.Request, typing.Callable[[web.Request], typing.Awaitable[web.Response]]],
-        typing.Awaitable[web.Response]
-    ]:
-    """Create an aiohttp.web authentication middleware as prescribed by app config, or None
+PASSWORD_HASH_ALGORITHM = "pbkdf2_sha256"
+PASSWORD_HASH_ITERATIONS = 100000
+JOB_TOKEN_HEADER = "X-Job-Token"
+JOB_TOKEN_QUERY_PARAM = "token"
+
+
+def hash_password(password: str, iterations: int = PASSWORD_HASH_ITERATIONS, salt: bytes = None) -> str:
+    """Hash a password for storage in the USERS configuration
+
+    :return: "pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>"
+    """
+    salt = salt if salt else os.urandom(16)
+    digest = pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "{}${}${}${}".format(PASSWORD_HASH_ALGORITHM, iterations, salt.hex(), digest.hex())
+
+
+def is_hashed_password(stored: str) -> bool:
+    return stored.startswith(PASSWORD_HASH_ALGORITHM + "$")
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check a password against a stored value from hash_password() (or a legacy plaintext value)"""
+    if (not is_hashed_password(stored)):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    try:
+        _, iterations, salt_hex, digest_hex = stored.split("$")
+        digest = pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), int(iterations))
+    except ValueError:
+        LOGGER.error("Malformed password hash in USERS configuration")
+        return False
+    return hmac.compare_digest(digest.hex(), digest_hex)
+
+
+class JobTokenSigner:
+    """Issues and verifies short-lived HMAC-signed access tokens scoped to a single job ID
+    """
+    def __init__(self, secret: bytes, ttl: int):
+        self.secret = secret
+        self.ttl = ttl
+
+    def _sign(self, payload: bytes) -> str:
+        return urlsafe_b64encode(hmac.new(self.secret, payload, sha256).digest()).decode("ascii").rstrip("=")
+
+    def issue(self, job_id: str) -> str:
+        payload = "{}:{}".format(job_id, int(time.time()) + self.ttl).encode("utf-8")
+        return "{}.{}".format(urlsafe_b64encode(payload).decode("ascii").rstrip("="), self._sign(payload))
+
+    def verify(self, token: str, job_id: str) -> bool:
+        """Check a token is validly signed, unexpired, and issued for job_id"""
+        try:
+            encoded_payload, signature = token.split(".")
+            payload = urlsafe_b64decode(encoded_payload + "=" * (-len(encoded_payload) % 4))
+            token_job_id, expiry = payload.decode("utf-8").rsplit(":", 1)
+            expiry = int(expiry)
+        except (ValueError, BinasciiError, UnicodeDecodeError):
+            return False
+        return (
+            hmac.compare_digest(self._sign(payload), signature)
+            and token_job_id == job_id
+            and expiry >= time.time()
+        )
+
+
+def get_job_token_signer(config: Config) -> typing.Union[JobTokenSigner, None]:
+    """Create the job token signer prescribed by app config, or None if authentication is disabled"""
+    security = config.server.security
+    if (security.authentication == "none"):
+        return None
+    return JobTokenSigner(security.job_token_secret, security.job_token_ttl)
+
+
+class BaseAuthenticator(ABC):
+    """(Abstract) base for pluggable request authentication schemes
+    """
+    @abstractmethod
+    async def authenticate(self, request: web.Request) -> typing.Union[str, None]:
+        """Return the authenticated principal's name, or None if the request is not authenticated"""
+        pass
+
+    def challenge(self) -> typing.Dict[str, str]:
+        """Headers to include on 401 responses"""
+        return {}
+
+
+class BasicAuthenticator(BaseAuthenticator):
+    """HTTP basic authentication against a {username: password or hash} dict, with an LRU cache of verified headers
+
+    :param failure_ttl: seconds for which failed credentials (and per-client failure counts) are remembered
+    :param failures_max: failed attempts per client (remote address) within failure_ttl, after which that client's
+        attempts are refused without checking the password
+    :param executor: executor to run password hash checks in (default: the event loop's default executor)
+    """
+    def __init__(
+        self,
+        users: typing.Dict[str, str],
+        cache_max: int = 256,
+        realm: str = "pyjobserver",
+        failure_ttl: float = 30,
+        failures_max: int = 10,
+        executor: typing.Union[Executor, None] = None,
+    ):
+        self.users = users
+        self.realm = realm
+        self.failures_max = failures_max
+        self.executor = executor
+        # Keyed by the raw Authorization header value, so a cache hit skips both the decode and the hash:
+        self.verified_cache = LRUCache(maxsize=cache_max)
+        self.failed_cache = TTLCache(maxsize=cache_max, ttl=failure_ttl)
+        self.client_failures = TTLCache(maxsize=cache_max, ttl=failure_ttl)
+        # In-progress checks by Authorization header, so concurrent identical requests (e.g. a burst of polls before
+        # the first is cached) don't each hash the password:
+        self.pending: typing.Dict[str, Future] = {}
+        plain_users = [user for user, stored in users.items() if not is_hashed_password(stored)]
+        if (plain_users):
+            LOGGER.warning("Plaintext passwords configured for USERS %s: Consider hash_password()", plain_users)
+
+    async def authenticate(self, request: web.Request) -> typing.Union[str, None]:
+        header = request.headers.get(hdrs.AUTHORIZATION)
+        if (not header):
+            return None
+        username = self.verified_cache.get(header)
+        if (username is not None):
+            return username
+        if (header in self.failed_cache):
+            return None
+        scheme, _, encoded = header.partition(" ")
+        if (scheme.lower() != "basic"):
+            return None
+        try:
+            username, _, password = b64decode(encoded.strip(), validate=True).decode("utf-8").partition(":")
+        except (BinasciiError, UnicodeDecodeError):
+            return None
+        stored = self.users.get(username)
+        if (stored is None):
+            return None
+        # Throttle by client rather than by user, so guessing at a known username can't lock its owner out:
+        client = request.remote or ""
+        if (self.client_failures.get(client, 0) >= self.failures_max):
+            LOGGER.warning("Refusing credentials from client '%s': Too many recent failed attempts", client)
+            return None
+        check = self.pending.get(header)
+        if (check is None):
+            check = ensure_future(self._check(header, username, password, stored))
+            self.pending[header] = check
+            check.add_done_callback(lambda _: self.pending.pop(header, None))
+        # (Shielded so one waiting request being cancelled doesn't cancel the check for the others)
+        if (not await shield(check)):
+            # Only completed checks count as failures:
+            self.client_failures[client] = self.client_failures.get(client, 0) + 1
+            return None
+        return username
+
+    async def _check(self, header: str, username: str, password: str, stored: str) -> bool:
+        """Verify a password and record the outcome in the header caches"""
+        if (is_hashed_password(stored)):
+            # PBKDF2 is deliberately slow: Keep it off the event loop
+            verified = await get_event_loop().run_in_executor(self.executor, verify_password, password, stored)
+        else:
+            verified = verify_password(password, stored)
+        if (verified):
+            self.verified_cache[header] = username
+        else:
+            self.failed_cache[header] = True
+        return verified
+
+    def challenge(self) -> typing.Dict[str, str]:
+        return { hdrs.WWW_AUTHENTICATE: 'Basic realm="{}"'.format(self.realm) }
+
+
+def get_authenticator(config: Config) -> typing.Union[BaseAuthenticator, None]:
+    """Create the authenticator prescribed by app config, or None
     """
-    policy = config.server.security.authentication
+    security = config.server.security
+    policy = security.authentication
     if (policy == "basic"):
-        return basic_auth_middleware(
-            ("/",),
-            config.server.security.users,
+        return BasicAuthenticator(
+            security.users,
+            cache_max=security.auth_cache_max,
+            failure_ttl=security.auth_failure_ttl,
+            failures_max=security.auth_failures_max,
         )
     elif (policy == "none"):
         return None
     else:
         raise ValueError("Unrecognised authentication policy '{}' in app config".format(policy))
+
+
+def get_authentication_middleware(
+    config: Config,
+    authenticator: typing.Union[BaseAuthenticator, None] = None,
+) -> typing.Callable[
+        [web.Request, typing.Callable[[web.Request], typing.Awaitable[web.Response]]],
+        typing.Awaitable[web.Response]
+    ]:
+    """Create an aiohttp.web authentication middleware as prescribed by app config, or None
+
+    :param authenticator: optional custom authenticator to use instead of the one prescribed by app config
+    """
+    authenticator = authenticator if authenticator else get_authenticator(config)
+    if (authenticator is None):
+        return None
+    job_tokens = get_job_token_signer(config)
+
+    @web.middleware
+    async def authentication_middleware(
+        request: web.Request,
+        handler: typing.Callable[[web.Request], typing.Awaitable[web.Response]],
+    ) -> web.Response:
+        # Fast path: A job token grants read access to its own job's routes only
+        job_id = request.match_info.get("id")
+        token = request.headers.get(JOB_TOKEN_HEADER) or request.query.get(JOB_TOKEN_QUERY_PARAM)
+        if (token and job_id and job_tokens and request.method == hdrs.METH_GET and job_tokens.verify(token, job_id)):
+            request["principal"] = "job:{}".format(job_id)
+            return await handler(request)
+
+        principal = await authenticator.authenticate(request)
+        if (principal is None):
+            raise web.HTTPUnauthorized(headers=authenticator.challenge())
+        request["principal"] = principal
+        return await handler(request)
+
+    return authentication_middleware
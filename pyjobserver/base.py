@@ -3,9 +3,11 @@
 # https://stackoverflow.com/a/33533514
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from asyncio import create_task, CancelledError, InvalidStateError
+from asyncio import create_task, CancelledError, Event, InvalidStateError, TimeoutError as AsyncTimeoutError, wait_for
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from logging import getLogger
+from time import monotonic
 from typing import Any, Awaitable, Callable, ClassVar, Dict, Generic, List, NamedTuple, Type, TypeVar, Union
 
 # External Imports:
@@ -13,14 +15,26 @@ from pyee import AsyncIOEventEmitter
 
 # Local Imports:
 from .config import Config
+from .models import BaseApiModel, BaseJobStatus
+from .progress import ProgressHistory
+from .staging import InputStager, StagedInput
 
 LOGGER = getLogger(__name__)
 
+# Job events which update the job's status (and so its version):
+STATUS_EVENTS = ("complete", "critical", "cancelled", "error", "warning", "info", "progress")
+
 class AbstractJobRunner(ABC):
     def __init__(self, app_config: Config, threadpool: Union[ThreadPoolExecutor,None] = None):
         super().__init__()
         self.app_config = app_config
         self.threadpool = threadpool if threadpool else ThreadPoolExecutor(app_config.server.job_runner_threads)
+        self.staging = InputStager(
+            app_config.server.staging_dir,
+            unclaimed_ttl=app_config.server.staged_input_ttl,
+            max_bytes=app_config.server.staged_input_max_bytes,
+            total_max_bytes=app_config.server.staged_inputs_total_max_bytes,
+        )
 
     @abstractmethod
     async def add_job(self, spec) -> str:
@@ -37,17 +51,22 @@ class Job(AsyncIOEventEmitter, Generic[T, S]):
     :ivar input: input data for the job
     :ivar runner: runner in which the job is being executed
     :ivar task: (asyncio.Task) wrapping the ongoing operation
+    :ivar status: (str) "running", "complete", "failed" or "cancelled"
+    :ivar version: (int) counter incremented on every status-relevant event (see STATUS_EVENTS)
+    :ivar start_time: (float) monotonic time the job started
+    :ivar end_time: (float) monotonic time the job completed, failed or was cancelled, or None if still running
+    :ivar progress_history: (ProgressHistory) bounded buffer of recent progress samples, for ETA estimation
 
     TODO: Improve event typings
     :event critical: (Exception) a critical error has caused the job to FAIL
     :event complete: (S) the job has finished with SUCCESS
+    :event cancelled: (CancelledError) the job's task was cancelled before finishing
     :event error: (Exception) a non-fatal but potentially serious error has occurred
     :event warning: (Exception) an important warning/caveat
     :event info: (Any) an informative update
     :event debug: (Any) a low-level, debug-oriented update
     :event progress: (JobProgress) progress / ETA information
 
-    TODO: Store last relevant event and expose interface to retrieve
     TODO: Maybe store all errors/warnings to notify with alongside result? Only really needed for sync pattern
     """
     def __init__(
@@ -71,11 +90,22 @@ class Job(AsyncIOEventEmitter, Generic[T, S]):
         self.id = id
         self.input = input
         self.runner = runner
+        self.status = "running"
+        self.version = 0
+        self.progress = None
+        self.message = None
+        self.result = None
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self._updated = Event()
+        self.start_time = monotonic()
+        self.end_time = None
+        self.progress_history = ProgressHistory(self.start_time, runner.app_config.server.job_progress_history)
         AsyncIOEventEmitter.__init__(self)
         self.task = create_task(coro(input, self, threadpool=threadpool))
 
         def onTaskDone(task):
-            """Task done handler to publish complete (success) & critical (fail) events"""
+            """Task done handler to publish complete (success), critical (fail) & cancelled events"""
             try:
                 err = task.exception()
                 if (err):
@@ -84,13 +114,7 @@ class Job(AsyncIOEventEmitter, Generic[T, S]):
                     result = task.result()
                     self.emit("complete", result)
             except CancelledError as err:
-                self.emit(
-                    "warning",
-                    CancelledError(
-                        "onTaskDone called after task cancelled"
-                    ).with_traceback(err.__traceback__)
-                )
-                LOGGER.warning("Shouldn't see onTaskDone when cancelled??")
+                self.emit("cancelled", err)
             except InvalidStateError as err:
                 self.emit(
                     "error",
@@ -100,3 +124,109 @@ class Job(AsyncIOEventEmitter, Generic[T, S]):
                 )
 
         self.task.add_done_callback(onTaskDone)
+
+    def emit(self, event: str, *args, **kwargs) -> bool:
+        """Record status-relevant events and wake any waiters, before publishing to listeners as usual"""
+        # (Other events, e.g. debug or pyee's internal new_listener, don't change the job's status)
+        if (event in STATUS_EVENTS):
+            arg = args[0] if len(args) else None
+            if (event == "complete"):
+                self.status = "complete"
+                self.result = arg
+                self.end_time = monotonic()
+            elif (event == "critical"):
+                self.status = "failed"
+                self.errors.append(str(arg))
+                self.end_time = monotonic()
+            elif (event == "cancelled"):
+                self.status = "cancelled"
+                self.end_time = monotonic()
+            elif (event == "error"):
+                self.errors.append(str(arg))
+            elif (event == "warning"):
+                self.warnings.append(str(arg))
+            elif (event == "info"):
+                self.message = str(arg)
+            elif (event == "progress"):
+                now = monotonic()
+                self.progress_history.append(now, arg.pct)
+                if (arg.time_elapsed is None):
+                    arg.time_elapsed = self.progress_history.elapsed(now)
+                if (arg.time_remaining is None):
+                    arg.time_remaining = self.progress_history.remaining(now)
+                self.progress = arg
+            self.version += 1
+            # Release everybody waiting on the current Event, and start a fresh one for subsequent waiters:
+            updated = self._updated
+            self._updated = Event()
+            updated.set()
+        return super().emit(event, *args, **kwargs)
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def claim_input(self, input_id: str) -> StagedInput:
+        """Claim a reference to a staged input for this job, valid until the job finishes
+
+        :raises KeyError: No such staged input
+        """
+        return self.runner.staging.acquire(input_id, self.id)
+
+    @property
+    def duration(self) -> float:
+        """Seconds the job has been running (or ran for, if done)"""
+        return (self.end_time if self.end_time is not None else monotonic()) - self.start_time
+
+    def estimate_remaining(self, expected_duration: Union[float, None] = None) -> Union[float, None]:
+        """Estimate seconds until the job finishes, or None if unknown
+
+        Uses the job's own recent progress rate where available, falling back to an expected total duration (e.g.
+        from historical jobs of the same type) if provided.
+        """
+        if (self.done):
+            return 0.0
+        remaining = self.progress_history.remaining(monotonic())
+        if (remaining is None and expected_duration is not None):
+            remaining = max(expected_duration - self.duration, 0.0)
+        return remaining
+
+    async def wait_for_update(self, since: int, timeout: float) -> int:
+        """Wait until the job's version exceeds `since`, the job finishes, or `timeout` seconds pass
+
+        :return: the job's current version
+        """
+        if (self.version <= since and not self.done and timeout > 0):
+            try:
+                await wait_for(self._updated.wait(), timeout)
+            except AsyncTimeoutError:
+                pass
+        return self.version
+
+    def get_status(self, expected_duration: Union[float, None] = None) -> BaseJobStatus:
+        """Snapshot the job's current status as an API model
+
+        :param expected_duration: (optional) expected total duration for the job (e.g. from historical jobs of the same
+            type), used to estimate time remaining if the job's own progress doesn't allow it
+        """
+        result = self.result
+        if (isinstance(result, BaseApiModel)):
+            result = result.__class__.Schema().dump(result).data
+        time_remaining = self.estimate_remaining(expected_duration)
+        progress = self.progress
+        if (progress is not None):
+            # Don't report the (now stale) ETA from when the progress event was emitted:
+            progress = replace(progress, time_remaining=time_remaining)
+        return BaseJobStatus(
+            job_type=self.input.job_type,
+            job_id=self.id,
+            errors=list(self.errors),
+            warnings=list(self.warnings),
+            status=self.status,
+            version=self.version,
+            message=self.message,
+            progress=progress,
+            result=result,
+            time_elapsed=self.duration,
+            time_remaining=time_remaining,
+        )
@@ -0,0 +1,242 @@
+"""Adaptive job concurrency control
+
+An AIMD (additive-increase, multiplicative-decrease) controller for the number of jobs a runner allows in parallel:
+While the host shows no signs of overload and demand is hitting the current limit, the limit creeps up; as soon as any
+overload signal trips, it's cut back multiplicatively. After a cut, further cuts are held off for a cooldown period
+so that slow-moving signals (like the 1-minute load average) get a chance to reflect it. The limit always stays within
+configured bounds.
+
+Overload signals are sampled periodically by the runner (see sample_host_signals()), plus per-job-type completion
+latency relative to each type's historical duration. CPU and memory signals respect the resources actually available to
+this process where they're discoverable (CPU affinity, and cgroup v2 or v1 limits, e.g. in a container), falling back
+to whole-host figures otherwise.
+"""
+
+# Built-Ins:
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from math import ceil
+import os
+from time import monotonic
+from typing import Dict, List, Union
+
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def read_cgroup_file(*paths: str) -> Union[str, None]:
+    """Contents of the first readable file among paths (relative to CGROUP_ROOT), or None"""
+    for path in paths:
+        try:
+            with open(os.path.join(CGROUP_ROOT, path)) as cgroup_file:
+                return cgroup_file.read().strip()
+        except OSError:
+            pass
+    return None
+
+
+def cgroup_cpu_limit() -> Union[float, None]:
+    """CPUs' worth of time this process's cgroup may use per period (from cgroup v2 cpu.max, or v1 CFS quota), or None
+    if unlimited or unknown
+    """
+    try:
+        cpu_max = read_cgroup_file("cpu.max")
+        if (cpu_max is not None):
+            quota, period = cpu_max.split()
+            return None if quota == "max" else int(quota) / int(period)
+        quota = read_cgroup_file("cpu/cpu.cfs_quota_us", "cpu,cpuacct/cpu.cfs_quota_us")
+        period = read_cgroup_file("cpu/cpu.cfs_period_us", "cpu,cpuacct/cpu.cfs_period_us")
+        if (quota is None or period is None or int(quota) <= 0):
+            return None
+        return int(quota) / int(period)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def effective_cpu_count() -> float:
+    """CPUs available to this process: The fewer of its CPU affinity set and its cgroup CPU limit (if any)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+def cpu_pressure() -> Union[float, None]:
+    """1-minute load average per effective CPU (~1.0 = fully busy), or None if unavailable on this platform
+
+    (The load average itself is host-wide, but is compared against only the CPUs this process may use)
+    """
+    try:
+        return os.getloadavg()[0] / effective_cpu_count()
+    except (AttributeError, OSError):
+        return None
+
+
+def cgroup_memory_pressure() -> Union[float, None]:
+    """Fraction of this process's cgroup memory limit in use (cgroup v2 memory.current/max, or v1 usage/limit), or
+    None if there's no limit or it's unknown
+    """
+    try:
+        limit = read_cgroup_file("memory.max")
+        if (limit is not None):
+            usage = read_cgroup_file("memory.current")
+        else:
+            limit = read_cgroup_file("memory/memory.limit_in_bytes")
+            usage = read_cgroup_file("memory/memory.usage_in_bytes")
+        if (limit is None or usage is None or limit == "max"):
+            return None
+        limit_bytes = int(limit)
+        # cgroup v1 reports "unlimited" as a huge number, and any limit over physical memory doesn't bind anyway:
+        if (limit_bytes <= 0 or limit_bytes >= os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")):
+            return None
+        return int(usage) / limit_bytes
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def host_memory_pressure() -> Union[float, None]:
+    """Fraction of host memory in use (0-1, from /proc/meminfo), or None if unavailable on this platform"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            values = {
+                line.split(":")[0]: int(line.split()[1])
+                for line in meminfo
+                if line.startswith(("MemTotal:", "MemAvailable:"))
+            }
+        return 1.0 - values["MemAvailable"] / values["MemTotal"]
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+def memory_pressure() -> Union[float, None]:
+    """Fraction of available memory in use (0-1): Against the cgroup limit if there is one, else the host's"""
+    cgroup_pressure = cgroup_memory_pressure()
+    return cgroup_pressure if cgroup_pressure is not None else host_memory_pressure()
+
+
+def executor_queue_depth(executor: ThreadPoolExecutor) -> Union[int, None]:
+    """Number of work items waiting for a free executor thread, or None if not measurable"""
+    work_queue = getattr(executor, "_work_queue", None)
+    return work_queue.qsize() if work_queue is not None else None
+
+
+def sample_host_signals(loop_lag: float, executor: ThreadPoolExecutor) -> Dict[str, Union[float, None]]:
+    """Collect the overload signals for one AdaptiveLimiter.update()
+
+    :param loop_lag: seconds by which a timed event loop sleep over-ran
+    :param executor: the runner's executor, to measure queue depth
+    """
+    return {
+        "loop_lag": loop_lag,
+        "queue_depth": executor_queue_depth(executor),
+        "cpu": cpu_pressure(),
+        "memory": memory_pressure(),
+    }
+
+
+class AdaptiveLimiter:
+    """AIMD controller for a concurrency limit
+
+    :ivar limit: (int) the current concurrency limit
+    :ivar signals: (dict) the most recently sampled overload signals
+    :ivar changes: (deque) recent limit changes, each a dict of time, limit, and reasons
+    :ivar last_decrease: (float) monotonic time of the last decrease, or None
+    """
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        decrease_factor: float = 0.7,
+        loop_lag_max: float = 0.1,
+        queue_depth_max: int = 0,
+        cpu_max: float = 0.9,
+        memory_max: float = 0.9,
+        latency_ratio_max: float = 1.5,
+        cooldown: float = 30,
+        history: int = 20,
+    ):
+        if (min_limit < 1 or max_limit < min_limit):
+            raise ValueError("AdaptiveLimiter bounds must satisfy 1 <= min_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max(initial, min_limit), max_limit)
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.last_decrease = None
+        self.thresholds = {
+            "loop_lag": loop_lag_max,
+            "queue_depth": queue_depth_max,
+            "cpu": cpu_max,
+            "memory": memory_max,
+        }
+        self.latency_ratio_max = latency_ratio_max
+        self.signals: Dict[str, Union[float, None]] = {}
+        self.latency_ratios: Dict[str, float] = {}
+        self.changes = deque(maxlen=history)
+
+    def record_completion(self, job_type: str, duration: float, expected: Union[float, None]):
+        """Note a job's completion latency relative to its type's expected duration (if known)"""
+        if (expected):
+            self.latency_ratios[job_type] = duration / expected
+
+    def overload_reasons(self) -> List[str]:
+        reasons = [
+            "{} {:.3g} > {:.3g}".format(name, self.signals[name], threshold)
+            for name, threshold in self.thresholds.items()
+            if self.signals.get(name) is not None and self.signals[name] > threshold
+        ]
+        reasons += [
+            "{} latency {:.2f}x expected".format(job_type, ratio)
+            for job_type, ratio in self.latency_ratios.items()
+            if ratio > self.latency_ratio_max
+        ]
+        return reasons
+
+    def update(self, signals: Dict[str, Union[float, None]], saturated: bool) -> int:
+        """Adjust the limit from freshly sampled signals
+
+        :param signals: overload signals as per sample_host_signals()
+        :param saturated: whether demand reached the current limit since the last update
+        :return: the new limit
+        """
+        self.signals = signals
+        reasons = self.overload_reasons()
+        # Latency observations are consumed by one update, so a single slow job doesn't keep cutting the limit:
+        self.latency_ratios = {}
+        if (reasons):
+            if (self.last_decrease is not None and monotonic() - self.last_decrease < self.cooldown):
+                # Still overloaded, but give the previous cut time to take effect before cutting again
+                new_limit = self.limit
+            else:
+                # Round up so the cut is never more than decrease_factor implies (rounding off float error first), but
+                # always cut by at least one:
+                reduced = ceil(round(self.limit * self.decrease_factor, 9))
+                new_limit = max(min(self.limit - 1, reduced), self.min_limit)
+                self.last_decrease = monotonic()
+        elif (saturated):
+            new_limit = min(self.limit + 1, self.max_limit)
+            reasons = ["saturated with no overload signals"]
+        else:
+            new_limit = self.limit
+        if (new_limit != self.limit):
+            self.changes.append({
+                "time": datetime.now().isoformat(),
+                "from": self.limit,
+                "to": new_limit,
+                "reasons": reasons,
+            })
+            self.limit = new_limit
+        return self.limit
+
+    def to_dict(self) -> dict:
+        return {
+            "limit": self.limit,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "signals": self.signals,
+            "changes": list(self.changes),
+        }
@@ -4,6 +4,7 @@
 # Built-Ins:
 from json import loads as json_loads
 from logging import getLogger
+import os
 
 # Local Imports:
 from .base import BaseConfig
@@ -20,3 +21,25 @@ class SecurityConfig(BaseConfig):
         else:
             self.authentication = "none"
             LOGGER.warn("No USERS supplied - starting open (unauthenticated) server")
+        self.auth_cache_max = int(raw["env"].get("AUTH_CACHE_MAX", 256))
+        self.auth_failure_ttl = float(raw["env"].get("AUTH_FAILURE_TTL", 30))
+        self.auth_failures_max = int(raw["env"].get("AUTH_FAILURES_MAX", 10))
+        # Without a configured secret, job tokens are only valid for the lifetime of this server process:
+        envsecret = raw["env"].get("JOB_TOKEN_SECRET")
+        self.job_token_secret = envsecret.encode("utf-8") if envsecret else os.urandom(32)
+        self.job_token_ttl = int(raw["env"].get("JOB_TOKEN_TTL", 3600))
+
+    def __str__(self):
+        # Don't leak secrets in config logs:
+        return (
+            '%s(authentication=%s, users=%s, auth_cache_max=%s, auth_failure_ttl=%s, auth_failures_max=%s, '
+            'job_token_ttl=%s)'
+        ) % (
+            type(self).__name__,
+            self.authentication,
+            list(getattr(self, "users", {}).keys()),
+            self.auth_cache_max,
+            self.auth_failure_ttl,
+            self.auth_failures_max,
+            self.job_token_ttl,
+        )
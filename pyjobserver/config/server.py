@@ -1,8 +1,12 @@
 """Server configuration
 """
 
+# Built-Ins:
+import os
+
 # Local Imports:
 from .base import BaseConfig
+from .env_utils import env_to_boolean
 from .security import SecurityConfig
 
 class ServerConfig(BaseConfig):
@@ -10,10 +14,34 @@ class ServerConfig(BaseConfig):
     """
     def __init__(self, raw):
         self.jobs_max = int(raw["env"].get("JOBS_MAX", 3))
+        # With JOBS_ADAPTIVE, JOBS_MAX is only the starting limit: It's tuned within JOBS_LIMIT_MIN-JOBS_LIMIT_MAX
+        self.jobs_adaptive = env_to_boolean(raw["env"].get("JOBS_ADAPTIVE"))
+        self.jobs_limit_min = int(raw["env"].get("JOBS_LIMIT_MIN", 1))
+        self.jobs_limit_max = int(raw["env"].get("JOBS_LIMIT_MAX", max(self.jobs_max, 2 * (os.cpu_count() or 1))))
+        self.jobs_adaptive_interval = float(raw["env"].get("JOBS_ADAPTIVE_INTERVAL", 2))
+        self.jobs_adaptive_loop_lag_max = float(raw["env"].get("JOBS_ADAPTIVE_LOOP_LAG_MAX", 0.1))
+        self.jobs_adaptive_queue_max = int(raw["env"].get("JOBS_ADAPTIVE_QUEUE_MAX", 0))
+        self.jobs_adaptive_cpu_max = float(raw["env"].get("JOBS_ADAPTIVE_CPU_MAX", 0.9))
+        self.jobs_adaptive_memory_max = float(raw["env"].get("JOBS_ADAPTIVE_MEMORY_MAX", 0.9))
+        self.jobs_adaptive_latency_max = float(raw["env"].get("JOBS_ADAPTIVE_LATENCY_MAX", 1.5))
+        self.jobs_adaptive_cooldown = float(raw["env"].get("JOBS_ADAPTIVE_COOLDOWN", 30))
         self.jobs_cache_max = int(raw["env"].get("JOBS_CACHE_MAX", 20))
         self.jobs_cache_ttl = int(raw["env"].get("JOBS_CACHE_TTL", 3600))
         self.job_runner_threads = int(raw["env"].get("JOB_RUNNER_THREADS", 20))
         self.job_timeout = int(raw["env"].get("JOB_RUNNER_TIMEOUT", 20 * 60))
+        # Cap on request bodies after decompression (zstd), which aiohttp's own body size limit doesn't cover:
+        self.request_decoded_max_bytes = int(raw["env"].get("REQUEST_DECODED_MAX_MB", 64)) * 1024 * 1024
+        self.job_status_wait_max = float(raw["env"].get("JOB_STATUS_WAIT_MAX", 30))
+        self.job_progress_history = int(raw["env"].get("JOB_PROGRESS_HISTORY", 32))
+        if (self.job_progress_history < 2):
+            raise ValueError("JOB_PROGRESS_HISTORY must be at least 2 (samples needed to estimate a progress rate)")
+        self.staging_dir = raw["env"].get("STAGING_DIR") or None
+        self.staged_input_ttl = int(raw["env"].get("STAGED_INPUT_TTL", self.jobs_cache_ttl))
+        self.staged_input_max_bytes = int(raw["env"].get("STAGED_INPUT_MAX_MB", 1024)) * 1024 * 1024
+        self.staged_inputs_total_max_bytes = int(raw["env"].get("STAGED_INPUTS_TOTAL_MAX_MB", 4096)) * 1024 * 1024
+        self.staged_input_sweep_interval = float(
+            raw["env"].get("STAGED_INPUT_SWEEP_INTERVAL", min(60, self.staged_input_ttl))
+        )
         self.port = int(raw["env"].get("PORT") or raw["env"].get("VCAP_PORT") or 4000)
         
         self.security = SecurityConfig(raw)
@@ -1,26 +1,174 @@
 """Web request (de-)/serialization
+
+Models are always (de-)serialized through their marshmallow Schemas, but the wire encoding is negotiated per request:
+
+- Responses are JSON by default, or MessagePack if the client's Accept header prefers it (and msgpack is installed)
+- Large response bodies are compressed with zstd (if zstandard is installed), gzip or deflate per Accept-Encoding
+- Request bodies may be MessagePack (Content-Type: application/msgpack) and/or zstd-compressed (Content-Encoding:
+  zstd). aiohttp itself already decodes gzip/deflate request bodies.
+
+MessagePack carries binary fields as raw bytes rather than inflated base64/number-array JSON text, which is where most
+of the saving comes from on large numeric payloads.
+
+Serialization and compression of large bodies run in the event loop's default executor, so that they don't stall the
+loop (which the adaptive concurrency limiter would read as overload).
 """
 
 # Built-Ins:
+from asyncio import get_event_loop
 from http import HTTPStatus
-from json import JSONDecodeError
+from json import JSONDecodeError, loads as json_loads
 from logging import getLogger
 import typing
 
 # External Imports:
-from aiohttp import web
+from aiohttp import hdrs, web
+from aiohttp.web import ContentCoding
 from marshmallow import Schema, ValidationError
-from webargs.aiohttpparser import parser
+from webargs.aiohttpparser import AIOHTTPParser
+
+# Optional External Imports:
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Local Imports:
 from .models import BaseApiModel
 
 LOGGER = getLogger(__name__)
 
-def web_response_from_model(result: BaseApiModel):
-    """Construct a web response from a result payload"""
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack")
+# Request headers which negotiated responses vary by:
+RESPONSE_VARY = "Accept, Accept-Encoding"
+# Bodies smaller than this aren't worth the CPU (or the header bytes) to compress:
+COMPRESSION_MIN_BYTES = 1024
+# Default cap on decompressed request body size, if the app config doesn't set one (aiohttp's client_max_size only
+# limits the compressed bytes received):
+DECODED_BODY_MAX_BYTES = 64 * 1024 * 1024
+DECOMPRESS_CHUNK_BYTES = 64 * 1024
+# Bodies at least this large are decoded (and gzip/deflate-compressed by aiohttp) in an executor, off the event loop:
+EXECUTOR_MIN_BYTES = 256 * 1024
+
+
+def parse_header_qualities(header: typing.Union[str, None]) -> typing.Dict[str, float]:
+    """Parse an Accept-style header into a {value: quality} dict (lower-cased values, default q=1)"""
+    result = {}
+    for item in (header or "").split(","):
+        parts = item.strip().split(";")
+        value = parts[0].strip().lower()
+        if (not value):
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, param_val = param.strip().partition("=")
+            if (key.strip() == "q"):
+                try:
+                    quality = float(param_val)
+                except ValueError:
+                    quality = 0.0
+        result[value] = quality
+    return result
+
+
+def if_none_match(header: typing.Union[str, None], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag, using weak comparison as RFC 7232 prescribes
+
+    (I.e. W/"x" and "x" match each other, and "*" matches any current representation)
+    """
+    def opaque_tag(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    if (not header):
+        return False
+    target = opaque_tag(etag)
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if (candidate == "*" or (candidate and opaque_tag(candidate) == target)):
+            return True
+    return False
+
+
+def negotiate_response_mimetype(request: typing.Union[web.Request, None]) -> str:
+    """Choose the response mimetype for a request: MessagePack only if available and preferred over JSON"""
+    if (request is None or msgpack is None):
+        return JSON_MIMETYPE
+    accepted = parse_header_qualities(request.headers.get(hdrs.ACCEPT))
+    msgpack_q = max(accepted.get(mimetype, 0.0) for mimetype in MSGPACK_MIMETYPES)
+    json_q = max(accepted.get(JSON_MIMETYPE, 0.0), accepted.get("application/*", 0.0), accepted.get("*/*", 0.0))
+    if (not accepted):
+        json_q = 1.0
+    return MSGPACK_MIMETYPE if (msgpack_q > 0 and msgpack_q >= json_q) else JSON_MIMETYPE
+
+
+def negotiate_content_coding(request: typing.Union[web.Request, None]) -> typing.Union[str, None]:
+    """Choose a response content-coding for a request ("zstd", "gzip", "deflate"), or None for identity"""
+    if (request is None):
+        return None
+    accepted = parse_header_qualities(request.headers.get(hdrs.ACCEPT_ENCODING))
+    candidates = ["gzip", "deflate"]
+    if (zstandard is not None):
+        candidates.insert(0, "zstd")
+    for coding in candidates:
+        if (accepted.get(coding, accepted.get("*", 0.0)) > 0):
+            return coding
+    return None
+
+
+def encode_model(result: BaseApiModel, mimetype: str = JSON_MIMETYPE) -> bytes:
+    """Serialize a model through its Schema to the body bytes of the given mimetype"""
+    schema = result.__class__.Schema()
+    if (mimetype == MSGPACK_MIMETYPE):
+        return msgpack.packb(schema.dump(result).data, use_bin_type=True)
+    return schema.dumps(result).data.encode("utf-8")
+
+
+def encode_response_body(
+    result: BaseApiModel,
+    mimetype: str,
+    coding: typing.Union[str, None],
+) -> typing.Tuple[bytes, typing.Union[str, None]]:
+    """Encode a model to response body bytes, zstd-compressing them if that's the negotiated coding
+
+    :return: the body, and its content-coding (None for identity): zstd is already applied, gzip/deflate are left for
+        aiohttp to apply
+    """
+    body = encode_model(result, mimetype)
+    if (len(body) < COMPRESSION_MIN_BYTES):
+        return body, None
+    if (coding == "zstd"):
+        return zstandard.ZstdCompressor().compress(body), coding
+    return body, coding
+
+
+async def web_response_from_model(result: BaseApiModel, request: typing.Union[web.Request, None] = None):
+    """Construct a web response from a result payload
+
+    If the originating request is provided, the response encoding and compression are negotiated from its headers.
+    Otherwise the response is plain JSON.
+    """
     try:
-        return web.json_response(body=result.__class__.Schema().dumps(result).data)
+        mimetype = negotiate_response_mimetype(request)
+        coding = negotiate_content_coding(request)
+        # The encoded size isn't known until it's been encoded, so always encode off the event loop:
+        body, coding = await get_event_loop().run_in_executor(
+            None, encode_response_body, result, mimetype, coding
+        )
+        response = web.Response(body=body, content_type=mimetype, zlib_executor_size=EXECUTOR_MIN_BYTES)
+        if (request is not None):
+            response.headers[hdrs.VARY] = RESPONSE_VARY
+        if (coding == "zstd"):
+            response.headers[hdrs.CONTENT_ENCODING] = "zstd"
+        elif (coding):
+            response.enable_compression(ContentCoding(coding))
+        return response
     except ValidationError as exc:
         LOGGER.exception(exc)
         raise web.HTTPInternalServerError(
@@ -30,6 +178,88 @@ def web_response_from_model(result: BaseApiModel):
         LOGGER.exception(exc)
         raise exc
 
+
+def decoded_body_max_bytes(request: web.Request) -> int:
+    """Maximum decompressed request body size, from the app's config if available"""
+    config = request.app.get("config")
+    return config.server.request_decoded_max_bytes if config else DECODED_BODY_MAX_BYTES
+
+
+def decompress_zstd(body: bytes, max_size: int) -> bytes:
+    """Decompress a zstd body incrementally, refusing to inflate beyond max_size bytes
+
+    (Streaming rather than one-shot, because a one-shot decompress trusts the frame header's claimed content size)
+
+    :raises web.HTTPRequestEntityTooLarge: decompressed body exceeds max_size
+    """
+    if (zstandard is None):
+        raise web.HTTPUnsupportedMediaType(text="zstd Content-Encoding is not supported by this server")
+    chunks = []
+    size = 0
+    try:
+        reader = zstandard.ZstdDecompressor().stream_reader(body)
+        while True:
+            chunk = reader.read(DECOMPRESS_CHUNK_BYTES)
+            if (not chunk):
+                break
+            size += len(chunk)
+            if (size > max_size):
+                raise web.HTTPRequestEntityTooLarge(
+                    max_size=max_size,
+                    actual_size=size,
+                    text="Decompressed body exceeds {} bytes".format(max_size),
+                )
+            chunks.append(chunk)
+    except zstandard.ZstdError as exc:
+        raise web.HTTPBadRequest(text="Cannot decompress zstd body.").with_traceback(exc.__traceback__)
+    return b"".join(chunks)
+
+
+def decode_body(body: bytes, content_type: str) -> typing.Any:
+    """Deserialize a (decompressed) MessagePack or JSON request body to plain Python data"""
+    if (content_type in MSGPACK_MIMETYPES):
+        if (msgpack is None):
+            raise web.HTTPUnsupportedMediaType(text="MessagePack bodies are not supported by this server")
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise web.HTTPBadRequest(text="Cannot deserialize MessagePack.").with_traceback(exc.__traceback__)
+    try:
+        return json_loads(body)
+    except ValueError as exc:
+        # (Covers JSONDecodeError and UnicodeDecodeError)
+        raise web.HTTPBadRequest(text="Cannot deserialize JSON.").with_traceback(exc.__traceback__)
+
+
+async def read_model_body(request: web.Request) -> typing.Any:
+    """Read and decode a (possibly zstd-compressed, possibly MessagePack) request body to plain Python data"""
+    body = await request.read()
+    loop = get_event_loop()
+    if (request.headers.get(hdrs.CONTENT_ENCODING, "").lower() == "zstd"):
+        # Always off the loop: Even a small compressed body may inflate up to the decoded size limit
+        body = await loop.run_in_executor(None, decompress_zstd, body, decoded_body_max_bytes(request))
+    if (len(body) >= EXECUTOR_MIN_BYTES):
+        return await loop.run_in_executor(None, decode_body, body, request.content_type)
+    return decode_body(body, request.content_type)
+
+
+class ModelParser(AIOHTTPParser):
+    """webargs aiohttp parser which also accepts MessagePack and zstd-compressed bodies in the 'json' location
+
+    (Large plain JSON bodies are also decoded here, to keep them off the event loop)
+    """
+    async def parse_json(self, req: web.Request, name: str, field) -> typing.Any:
+        if (self._cache.get("json") is None and req.body_exists and (
+            req.content_type in MSGPACK_MIMETYPES
+            or req.headers.get(hdrs.CONTENT_ENCODING, "").lower() == "zstd"
+            or (req.content_length or 0) >= EXECUTOR_MIN_BYTES
+        )):
+            self._cache["json"] = await read_model_body(req)
+        return await super().parse_json(req, name, field)
+
+parser = ModelParser()
+
+
 def get_model_webargs_middleware(schema: Schema):
     @web.middleware # noqa: Z110
     async def model_webargs_middleware(
@@ -24,19 +24,48 @@ class JobProgress(BaseApiModel):
     """A progress update object for a Job"""
     pct: float = field(metadata={ "required": True })
     message: str = field(default=None)
-    # TODO: What data type should our elapsed and remaining times be?
     timestamp: datetime = field(default_factory=datetime.now)
-    time_elapsed: Any = field(default=None, metadata={ "load_from": "timeElapsed", "dump_to": "timeElapsed" })
-    time_remaining: Any = field(default=None, metadata={ "load_from": "timeRemaining", "dump_to": "timeRemaining" })
+    # Elapsed and remaining (ETA) times in seconds: Filled in by the Job from its progress history if not supplied
+    time_elapsed: Union[None, float] = field(
+        default=None,
+        metadata={ "load_from": "timeElapsed", "dump_to": "timeElapsed" },
+    )
+    time_remaining: Union[None, float] = field(
+        default=None,
+        metadata={ "load_from": "timeRemaining", "dump_to": "timeRemaining" },
+    )
 
 @dataclass
 class BaseJobStatus(BaseJobSpec):
     job_id: str = field(metadata={ "load_from": "id", "dump_to": "id" })
     errors: Union[None, List[Any]] = field(default=None, metadata={ "required": False })
     warnings: Union[None, List[Any]] = field(default=None, metadata={ "required": False })
+    status: str = field(default="running")
+    # Incremented on every status update: Clients can long-poll for changes since a version they've seen
+    version: int = field(default=0)
+    message: Union[None, str] = field(default=None, metadata={ "required": False })
+    progress: Union[None, JobProgress] = field(default=None, metadata={ "required": False })
+    result: Any = field(default=None, metadata={ "required": False })
+    # Computed when the status is read (seconds): Remaining is 0 once the job is done, or None if unknown
+    time_elapsed: Union[None, float] = field(
+        default=None,
+        metadata={ "load_from": "timeElapsed", "dump_to": "timeElapsed" },
+    )
+    time_remaining: Union[None, float] = field(
+        default=None,
+        metadata={ "load_from": "timeRemaining", "dump_to": "timeRemaining" },
+    )
 
 @dataclass
 class JobCreatedResult(BaseApiModel):
     """Response for successful job creation"""
     # TODO: Why not just return the initial BaseJobStatus?
     job_id: str = field(metadata={ "load_from": "id", "dump_to": "id" })
+    # Short-lived token granting access to this job's status & websocket (if server authentication is enabled)
+    token: Union[None, str] = field(default=None, metadata={ "required": False })
+
+@dataclass
+class InputStagedResult(BaseApiModel):
+    """Response for a successfully staged input upload"""
+    input_id: str = field(metadata={ "load_from": "id", "dump_to": "id" })
+    size: int = field()
@@ -0,0 +1,109 @@
+"""Compact progress tracking and duration statistics for jobs
+
+Progress samples are kept in fixed-size, array-backed ring buffers (rather than lists of JobProgress objects), so the
+memory held per job is bounded and small regardless of how chatty its progress updates are.
+"""
+
+# Built-Ins:
+from array import array
+from typing import Union
+
+
+class ProgressHistory:
+    """Fixed-capacity ring buffer of (monotonic timestamp, percent complete) samples with rate-based ETA
+
+    :ivar start_time: (float) monotonic time the job started, from which elapsed time is measured
+    :ivar capacity: (int) maximum number of samples retained: older samples are overwritten
+    """
+    def __init__(self, start_time: float, capacity: int = 32):
+        if (capacity < 2):
+            raise ValueError("ProgressHistory capacity must be at least 2")
+        self.start_time = start_time
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._pcts = array("d", bytes(8 * capacity))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, pct: float):
+        self._times[self._next] = timestamp
+        self._pcts[self._next] = pct
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _oldest_index(self) -> int:
+        return (self._next - self._count) % self.capacity
+
+    def _latest_index(self) -> int:
+        return (self._next - 1) % self.capacity
+
+    def elapsed(self, now: float) -> float:
+        """Seconds elapsed since the job started"""
+        return now - self.start_time
+
+    def rate(self) -> Union[float, None]:
+        """Recent progress rate in percent per second, or None if not yet measurable
+
+        Measured across the retained window of samples, or from job start if there's only one sample.
+        """
+        if (not self._count):
+            return None
+        latest = self._latest_index()
+        if (self._count == 1):
+            t_from, pct_from = self.start_time, 0.0
+        else:
+            oldest = self._oldest_index()
+            t_from, pct_from = self._times[oldest], self._pcts[oldest]
+        duration = self._times[latest] - t_from
+        if (duration <= 0):
+            return None
+        rate = (self._pcts[latest] - pct_from) / duration
+        return rate if rate > 0 else None
+
+    def remaining(self, now: float) -> Union[float, None]:
+        """Estimated seconds remaining (ETA) at time `now`, or None if unknown"""
+        rate = self.rate()
+        if (rate is None):
+            return None
+        latest = self._latest_index()
+        remaining = (100.0 - self._pcts[latest]) / rate - (now - self._times[latest])
+        return max(remaining, 0.0)
+
+
+class DurationStats:
+    """Running statistics of completed job durations (in seconds) for a job type
+
+    :ivar count: (int) number of durations recorded
+    :ivar mean: (float) arithmetic mean duration
+    :ivar ewma: (float) exponentially-weighted moving average duration, favouring recent jobs
+    """
+    def __init__(self, ewma_alpha: float = 0.2):
+        self.ewma_alpha = ewma_alpha
+        self.count = 0
+        self.mean = 0.0
+        self.ewma = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, duration: float):
+        self.count += 1
+        self.mean += (duration - self.mean) / self.count
+        self.ewma = duration if self.count == 1 else self.ewma + self.ewma_alpha * (duration - self.ewma)
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = duration if self.max is None else max(self.max, duration)
+
+    def expected(self) -> Union[float, None]:
+        """Expected duration of the next job of this type, or None if no history"""
+        return self.ewma if self.count else None
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "ewma": self.ewma,
+            "min": self.min,
+            "max": self.max,
+        }
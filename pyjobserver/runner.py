@@ -1,24 +1,35 @@
 # Built-Ins:
-from asyncio import get_event_loop, iscoroutinefunction
+from asyncio import CancelledError, create_task, get_event_loop, iscoroutinefunction
 from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
 import inspect
 from logging import getLogger
+from time import monotonic
 from typing import Any, Awaitable, Callable, ClassVar, Dict, Generic, List, NamedTuple, Type, TypeVar, Union
 from uuid import uuid4 as generate_guid
 
 # External Dependencies:
-from aiohttp import web, WSMsgType
+from aiohttp import hdrs, web, WSMsgType
 from asyncio import sleep
 from cachetools import TTLCache
 from json import dumps as json_dumps
 from pyee import AsyncIOEventEmitter
-from webargs.aiohttpparser import parser
 
 # Internal Dependencies:
+from .access_control import get_job_token_signer
+from .concurrency import AdaptiveLimiter, sample_host_signals
 from .config import Config
 from .base import AbstractJobRunner, Job
-from .models import BaseApiModel, BaseJobSpec, JobCreatedResult, JobProgress
-from .model_processing import get_model_webargs_middleware
+from .models import BaseApiModel, BaseJobSpec, InputStagedResult, JobCreatedResult, JobProgress
+from .model_processing import (
+    get_model_webargs_middleware,
+    if_none_match,
+    parser,
+    RESPONSE_VARY,
+    web_response_from_model,
+)
+from .progress import DurationStats
+from .staging import StagedInputTooLarge, StagingFull
 
 # TODO: Add timeouts at runner level
 # TODO: Add cancellation support
@@ -32,6 +43,22 @@ class JobRunner(AbstractJobRunner):
         self.spec_model_types: Dict[Type[BaseJobSpec]] = {}
         self.jobs_active: List[Job] = []
         self.jobs_cache = TTLCache(maxsize=app_config.server.jobs_cache_max, ttl=app_config.server.jobs_cache_ttl)
+        self.job_tokens = get_job_token_signer(app_config)
+        self.job_durations: Dict[str, DurationStats] = {}
+        server_config = app_config.server
+        self.limiter = AdaptiveLimiter(
+            server_config.jobs_max,
+            min_limit=server_config.jobs_limit_min,
+            max_limit=server_config.jobs_limit_max,
+            loop_lag_max=server_config.jobs_adaptive_loop_lag_max,
+            queue_depth_max=server_config.jobs_adaptive_queue_max,
+            cpu_max=server_config.jobs_adaptive_cpu_max,
+            memory_max=server_config.jobs_adaptive_memory_max,
+            latency_ratio_max=server_config.jobs_adaptive_latency_max,
+            cooldown=server_config.jobs_adaptive_cooldown,
+        ) if server_config.jobs_adaptive else None
+        # Whether demand has reached the limit since the limiter's last update:
+        self.jobs_saturated = False
     
     def register_job_handler(self, type_name: str, handler: Callable[[BaseJobSpec], Awaitable[BaseApiModel]]):
         signature = inspect.signature(handler)
@@ -45,15 +72,68 @@ class JobRunner(AbstractJobRunner):
         self.spec_model_types[type_name] = SuppliedJobSpec
         self.logger.info("Registered handler for job type '%s'", type_name)
 
+    @property
+    def jobs_limit(self) -> int:
+        """The current maximum number of parallel jobs"""
+        return self.limiter.limit if self.limiter else self.app_config.server.jobs_max
+
+    async def run_concurrency_control(self):
+        """Periodically sample overload signals and update the adaptive concurrency limit (until cancelled)"""
+        interval = self.app_config.server.jobs_adaptive_interval
+        while True:
+            started = monotonic()
+            await sleep(interval)
+            loop_lag = max(monotonic() - started - interval, 0.0)
+            saturated = self.jobs_saturated or len(self.jobs_active) >= self.limiter.limit
+            self.jobs_saturated = False
+            previous = self.limiter.limit
+            limit = self.limiter.update(sample_host_signals(loop_lag, self.threadpool), saturated)
+            if (limit != previous):
+                self.logger.info(
+                    "Concurrency limit %d -> %d: %s", previous, limit, "; ".join(self.limiter.changes[-1]["reasons"])
+                )
+
+    async def run_staging_sweeper(self):
+        """Periodically expire unclaimed staged inputs (until cancelled)"""
+        while True:
+            await sleep(self.app_config.server.staged_input_sweep_interval)
+            self.staging.sweep()
+
+    def expected_duration(self, job_type: str) -> Union[float, None]:
+        """Expected duration of a job of the given type from historical jobs, or None if no history"""
+        stats = self.job_durations.get(job_type)
+        return stats.expected() if stats else None
+
+    def estimate_job_remaining(self, job: Job) -> Union[float, None]:
+        """Estimate seconds until a job finishes from its progress, or its job type's historical durations"""
+        return job.estimate_remaining(self.expected_duration(job.input.job_type))
+
+    def estimate_wait(self) -> Union[float, None]:
+        """Estimate seconds until a job slot becomes free (0 if one is free now), or None if unknown"""
+        if (len(self.jobs_active) < self.jobs_limit):
+            return 0.0
+        estimates = [self.estimate_job_remaining(job) for job in self.jobs_active]
+        estimates = [est for est in estimates if est is not None]
+        return min(estimates) if estimates else None
+
     def get_status_handler(self):
         async def status_handler(request: web.Request) -> web.Response:
-            return web.json_response({ "jobsActive": len(self.jobs_active) })
+            return web.json_response({
+                "jobsActive": len(self.jobs_active),
+                "jobsLimit": self.jobs_limit,
+                "concurrency": self.limiter.to_dict() if self.limiter else None,
+                "estimatedWait": self.estimate_wait(),
+                "jobDurations": { job_type: stats.to_dict() for job_type, stats in self.job_durations.items() },
+            })
         return status_handler
 
     async def add_job(self, spec: BaseJobSpec) -> str:
-        if (len(self.jobs_active) >= self.app_config.server.jobs_max):
+        if (len(self.jobs_active) >= self.jobs_limit):
+            self.jobs_saturated = True
+            wait = self.estimate_wait()
             raise web.HTTPTooManyRequests(
-                text="Maximum parallel job limit ({}) reached: Try again later".format(self.app_config.server.jobs_max)
+                text="Maximum parallel job limit ({}) reached: Try again later".format(self.jobs_limit),
+                headers={ hdrs.RETRY_AFTER: str(max(int(wait + 0.5), 1)) } if wait is not None else None,
             )
         else:
             job_type = spec.job_type
@@ -69,6 +149,9 @@ class JobRunner(AbstractJobRunner):
             async def handle_critical(err):
                 return await self.on_job_critical(job_id, job, job_type, err)
             job.on("critical", handle_critical)
+            async def handle_cancelled(err):
+                return await self.on_job_cancelled(job_id, job, job_type, err)
+            job.on("cancelled", handle_cancelled)
             async def handle_debug(msg):
                 return await self.on_job_debug(job_id, job, job_type, msg)
             job.on("debug", handle_debug)
@@ -89,12 +172,32 @@ class JobRunner(AbstractJobRunner):
             return job_id
         
         
+    def release_job(self, job: Job):
+        """Remove a finished job from the active list and release its staged inputs
+
+        (The job itself stays in jobs_cache for status queries)
+        """
+        if (job in self.jobs_active):
+            self.jobs_active.remove(job)
+        self.staging.release(job.id)
+
     async def on_job_complete(self, job_id: str, job: Job, job_type: str, result: Any):
-        self.logger.info("[Job %s - %s] COMPLETE", job_id, job_type)
+        self.logger.info("[Job %s - %s] COMPLETE in %.1fs", job_id, job_type, job.duration)
+        self.release_job(job)
+        # Only successful runs are representative of how long a job of this type takes:
+        stats = self.job_durations.setdefault(job_type, DurationStats())
+        if (self.limiter):
+            self.limiter.record_completion(job_type, job.duration, stats.expected())
+        stats.add(job.duration)
 
     async def on_job_critical(self, job_id: str, job: Job, job_type: str, err: Exception):
         self.logger.error("[Job %s - %s] FAILED: %s", job_id, job_type, err)
+        self.release_job(job)
         
+    async def on_job_cancelled(self, job_id: str, job: Job, job_type: str, err: Exception):
+        self.logger.warning("[Job %s - %s] CANCELLED", job_id, job_type)
+        self.release_job(job)
+
     async def on_job_debug(self, job_id: str, job: Job, job_type: str, msg: Any):
         self.logger.debug("[Job %s - %s] %s", job_id, job_type, msg)
         
@@ -105,7 +208,13 @@ class JobRunner(AbstractJobRunner):
         self.logger.info("[Job %s - %s] %s", job_id, job_type, msg)
         
     async def on_job_progress(self, job_id: str, job: Job, job_type: str, progress: JobProgress):
-        self.logger.debug("[Job %s - %s] progress: %d%%", job_id, job_type, progress.pct)
+        self.logger.debug(
+            "[Job %s - %s] progress: %d%% (ETA %s)",
+            job_id,
+            job_type,
+            progress.pct,
+            "{:.1f}s".format(progress.time_remaining) if progress.time_remaining is not None else "unknown",
+        )
 
     async def on_job_warning(self, job_id: str, job: Job, job_type: str, msg: Any):
         self.logger.warning("[Job %s - %s] %s", job_id, job_type, msg)
@@ -122,7 +231,8 @@ class JobRunner(AbstractJobRunner):
 
                 async def do_the_do(request: web.Request) -> web.Response:
                     job_id = await self.add_job(request.get("model"))
-                    return web.json_response(body=JobCreatedResult.Schema().dumps(JobCreatedResult(job_id)).data)
+                    token = self.job_tokens.issue(job_id) if self.job_tokens else None
+                    return await web_response_from_model(JobCreatedResult(job_id, token), request)
 
                 return await get_model_webargs_middleware(SpecModel.Schema(strict=True))(request, do_the_do)
             except web.HTTPException as err:
@@ -138,20 +248,61 @@ class JobRunner(AbstractJobRunner):
                 raise err
         return add_job_handler
     
+    def get_stage_input_handler(self):
+        async def stage_input_handler(request: web.Request) -> web.Response:
+            try:
+                try:
+                    staged = await self.staging.stage_chunks(request.content.iter_chunked(1 << 20))
+                except StagedInputTooLarge as err:
+                    raise web.HTTPRequestEntityTooLarge(
+                        max_size=self.staging.max_bytes,
+                        actual_size=request.content_length or 0,
+                        text=str(err),
+                    )
+                except StagingFull as err:
+                    raise web.HTTPInsufficientStorage(text=str(err))
+                return await web_response_from_model(InputStagedResult(staged.id, staged.size), request)
+            except web.HTTPException as err:
+                # If the process already raises an HTTPException (or subclass), JSONify any plain text messages and
+                # pass through:
+                if (err.content_type == "text/plain"):
+                    self.logger.debug("Converting plain text error")
+                    err.text = json_dumps({
+                        "ok": False,
+                        "message": err.text,
+                    })
+                    err.content_type = "application/json"
+                raise err
+        return stage_input_handler
+
     def get_job_status_handler(self):
         async def job_status_handler(request: web.Request) -> web.Response:
             try:
                 job_id = request.match_info["id"]
                 job = self.jobs_cache.get(job_id)
-                if (job):
-                    # TODO: Implement job status handler
-                    return web.json_response({
-                        "ok": True,
-                        "id": job_id,
-                        "warnings": ["TODO: NotImplemented"]
-                    })
-                else:
+                if (not job):
                     raise web.HTTPNotFound(text="No such job ID '{}'".format(job_id))
+                try:
+                    wait = min(float(request.query.get("wait", 0)), self.app_config.server.job_status_wait_max)
+                    since = int(request.query["since"]) if "since" in request.query else None
+                except ValueError:
+                    raise web.HTTPBadRequest(text="'wait' and 'since' query parameters must be numeric")
+
+                # Long-poll: Park until the job moves past the client's known version (or the wait expires)
+                if (since is not None and wait > 0):
+                    await job.wait_for_update(since, wait)
+
+                # Weak because the body may be differently encoded/compressed for the same status version:
+                etag = 'W/"{}"'.format(job.version)
+                if (if_none_match(request.headers.get(hdrs.IF_NONE_MATCH), etag)):
+                    return web.Response(
+                        status=HTTPStatus.NOT_MODIFIED,
+                        headers={ hdrs.ETAG: etag, hdrs.VARY: RESPONSE_VARY },
+                    )
+                status = job.get_status(self.expected_duration(job.input.job_type))
+                response = await web_response_from_model(status, request)
+                response.headers[hdrs.ETAG] = etag
+                return response
             except web.HTTPException as err:
                 # If the process already raises an HTTPException (or subclass), JSONify any plain text messages and
                 # pass through:
@@ -196,7 +347,26 @@ class JobRunner(AbstractJobRunner):
         app["config"] = self.app_config
         app.router.add_get("/", self.get_status_handler())
         app.router.add_post("/", self.get_add_job_handler())
-        # TODO: GET on job ID yields last relevant status as long as job is retained in cache, otherwise 404
+        # Raw (application/octet-stream) upload of a large input, for jobs to claim by the returned ID:
+        app.router.add_post("/inputs", self.get_stage_input_handler())
+        # GET on job ID yields last relevant status as long as job is retained in cache, otherwise 404
         app.router.add_get("/{id}", self.get_job_status_handler())
         app.router.add_get("/{id}/ws", self.get_job_socket_handler())
+        async def start_background_tasks(app: web.Application):
+            app["staging_sweeper"] = create_task(self.run_staging_sweeper())
+            if (self.limiter):
+                app["concurrency_control"] = create_task(self.run_concurrency_control())
+        async def cleanup_background_tasks(app: web.Application):
+            for key in ("staging_sweeper", "concurrency_control"):
+                task = app.get(key)
+                if (task):
+                    task.cancel()
+                    try:
+                        await task
+                    except CancelledError:
+                        pass
+            # Staged inputs live outside the process (e.g. in /dev/shm): Don't leave them behind
+            self.staging.close()
+        app.on_startup.append(start_background_tasks)
+        app.on_cleanup.append(cleanup_background_tasks)
         return app
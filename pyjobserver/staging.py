@@ -0,0 +1,197 @@
+"""Shared-memory staging of large job inputs
+
+Large inputs (uploaded, or computed in-server) are written once into memory-mapped files in a staging directory -
+RAM-backed /dev/shm by default where available - and passed around by a small, picklable StagedInput reference. Jobs
+handing work to a process pool can pass that reference instead of pickling the data, and workers map the same pages
+read-only as a zero-copy memoryview:
+
+    ref = taskobj.claim_input(input.data_id)
+    result = await get_event_loop().run_in_executor(process_pool, score_fn, ref)
+
+    def score_fn(ref: StagedInput):
+        with open_staged_input(ref) as view:
+            data = numpy.frombuffer(view, dtype=numpy.float64)  # No copy
+            ...
+
+Inputs are reference-counted by the jobs that claim them, and deleted when the last holding job releases them.
+Inputs nobody claims are swept after a time-to-live, and the total size of all staged inputs is capped.
+"""
+
+# Built-Ins:
+from contextlib import contextmanager
+from logging import getLogger
+import mmap
+import os
+import tempfile
+from time import monotonic
+from typing import AsyncIterable, Dict, Iterator, NamedTuple, Set, Union
+from uuid import uuid4 as generate_guid
+
+
+class StagedInput(NamedTuple):
+    """Picklable reference to a staged input, safe to pass to other processes on the same host"""
+    id: str
+    path: str
+    size: int
+
+
+@contextmanager
+def open_staged_input(staged: StagedInput) -> Iterator[memoryview]:
+    """Map a staged input read-only, yielding a zero-copy memoryview of its contents
+
+    The mapping is closed on leaving the context, unless objects created on top of the view (e.g. numpy arrays) are
+    still alive: In that case it stays valid, and is unmapped when the last of them is garbage collected.
+    """
+    if (staged.size == 0):
+        yield memoryview(b"")
+        return
+    with open(staged.path, "rb") as staged_file:
+        mapped = mmap.mmap(staged_file.fileno(), staged.size, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        try:
+            view.release()
+            mapped.close()
+        except BufferError:
+            # Exported buffers still reference the mapping: Leave it to the garbage collector
+            pass
+
+
+class StagedInputTooLarge(ValueError):
+    pass
+
+
+class StagingFull(ValueError):
+    """Staging the input would exceed the total bytes budget for all staged inputs"""
+    pass
+
+
+def default_staging_dir() -> str:
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class InputStager:
+    """Creates, reference-counts and cleans up staged inputs
+
+    :ivar directory: (str) where staged input files are created
+    :ivar unclaimed_ttl: (float) seconds an input is retained if no job has claimed it yet
+    :ivar max_bytes: (int) maximum size of a single staged input
+    :ivar total_max_bytes: (int) maximum total size of all staged inputs (including uploads in progress)
+    :ivar total_bytes: (int) current total size of all staged inputs (including uploads in progress)
+    """
+    def __init__(
+        self,
+        directory: Union[str, None] = None,
+        unclaimed_ttl: float = 3600,
+        max_bytes: int = 1 << 30,
+        total_max_bytes: int = 4 << 30,
+    ):
+        self.directory = directory if directory else default_staging_dir()
+        self.unclaimed_ttl = unclaimed_ttl
+        self.max_bytes = max_bytes
+        self.total_max_bytes = total_max_bytes
+        self.total_bytes = 0
+        self.logger = getLogger("InputStager")
+        self.inputs: Dict[str, StagedInput] = {}
+        self.holders: Dict[str, Set[str]] = {}
+        self.unclaimed_since: Dict[str, float] = {}
+
+    def _register(self, staged: StagedInput) -> StagedInput:
+        self.inputs[staged.id] = staged
+        self.holders[staged.id] = set()
+        self.unclaimed_since[staged.id] = monotonic()
+        self.logger.debug("Staged input %s (%d bytes)", staged.id, staged.size)
+        return staged
+
+    def _new_file(self):
+        self.sweep()
+        input_id = str(generate_guid())
+        fd, path = tempfile.mkstemp(prefix="pyjobserver-", suffix="-" + input_id, dir=self.directory)
+        return input_id, path, os.fdopen(fd, "wb")
+
+    def _reserve(self, nbytes: int, size: int):
+        """Account for nbytes more of an input (now size bytes in total) against the size limits
+
+        :raises StagedInputTooLarge: The input exceeds max_bytes
+        :raises StagingFull: All staged inputs together would exceed total_max_bytes
+        """
+        if (size > self.max_bytes):
+            raise StagedInputTooLarge("Input exceeds staging limit {} bytes".format(self.max_bytes))
+        if (self.total_bytes + nbytes > self.total_max_bytes):
+            raise StagingFull("Staging area full ({} bytes): Try again later".format(self.total_max_bytes))
+        self.total_bytes += nbytes
+
+    def stage(self, data) -> StagedInput:
+        """Stage a bytes-like object (e.g. bytes, memoryview, array, numpy array), copying it exactly once"""
+        view = memoryview(data).cast("B")
+        self._reserve(view.nbytes, view.nbytes)
+        try:
+            input_id, path, staged_file = self._new_file()
+            with staged_file:
+                staged_file.write(view)
+        except BaseException:
+            self.total_bytes -= view.nbytes
+            raise
+        return self._register(StagedInput(input_id, path, view.nbytes))
+
+    async def stage_chunks(self, chunks: AsyncIterable[bytes]) -> StagedInput:
+        """Stage a stream of chunks (e.g. an upload body) without buffering the whole input in memory"""
+        input_id, path, staged_file = self._new_file()
+        size = 0
+        try:
+            with staged_file:
+                async for chunk in chunks:
+                    self._reserve(len(chunk), size + len(chunk))
+                    size += len(chunk)
+                    staged_file.write(chunk)
+        except BaseException:
+            self.total_bytes -= size
+            os.remove(path)
+            raise
+        return self._register(StagedInput(input_id, path, size))
+
+    def acquire(self, input_id: str, holder: str) -> StagedInput:
+        """Add a reference to a staged input on behalf of holder (e.g. a job ID)
+
+        :raises KeyError: No such staged input (it may have expired unclaimed)
+        """
+        staged = self.inputs[input_id]
+        self.holders[input_id].add(holder)
+        self.unclaimed_since.pop(input_id, None)
+        return staged
+
+    def release(self, holder: str):
+        """Drop all of holder's references, deleting any staged inputs no longer referenced"""
+        for input_id, input_holders in list(self.holders.items()):
+            if (holder in input_holders):
+                input_holders.discard(holder)
+                if (not input_holders):
+                    self._delete(input_id)
+
+    def sweep(self):
+        """Delete staged inputs which have gone unclaimed for longer than unclaimed_ttl"""
+        cutoff = monotonic() - self.unclaimed_ttl
+        for input_id, since in list(self.unclaimed_since.items()):
+            if (since < cutoff):
+                self.logger.info("Expiring unclaimed staged input %s", input_id)
+                self._delete(input_id)
+
+    def close(self):
+        """Delete all staged inputs"""
+        for input_id in list(self.inputs):
+            self._delete(input_id)
+
+    def _delete(self, input_id: str):
+        staged = self.inputs.pop(input_id, None)
+        self.holders.pop(input_id, None)
+        self.unclaimed_since.pop(input_id, None)
+        if (staged):
+            self.total_bytes -= staged.size
+            try:
+                # Any processes still mapping the file keep their pages until they unmap:
+                os.remove(staged.path)
+            except FileNotFoundError:
+                pass
+            self.logger.debug("Released staged input %s", input_id)